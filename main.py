@@ -1,12 +1,48 @@
-from typing import TypedDict, Union
-import glob
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    FrozenSet,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypedDict,
+    Union,
+)
+import asyncio
+import fnmatch
+import functools
+import hashlib
 import os
-import yaml
+import pickle
+import shutil
+import sys
+import tempfile
 from pathlib import Path
-from openai import OpenAI
-import pathspec
+
+# Heavy dependencies are imported where they are used to keep startup fast
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 PROJECT_NAME = "ai-fileworker"
+DEFAULT_WORKERS = 8
+
+# Instruction appended to every file's content in the user message
+USER_PROMPT_SUFFIX = (
+    "\n\n# Please only return the modified file content, and nothing else."
+)
+
+# Environment variable values treated as true for boolean settings
+TRUTHY_VALUES = frozenset({"yes", "y", "true", "t", "1", "on"})
+
+# Mapping of config keys to environment variable names
+ENV_VAR_MAPPING: Tuple[Tuple[str, str], ...] = (
+    ("api_key", "API_KEY"),
+    ("model", "MODEL"),
+    ("api_base_url", "API_BASE_URL"),
+    ("action", "ACTION"),
+    ("in_place", "IN_PLACE"),
+)
 
 
 class Config(TypedDict, total=False):
@@ -17,42 +53,116 @@ class Config(TypedDict, total=False):
     in_place: Union[bool, str]  # Can be bool or str when loaded from environment
 
 
+@functools.lru_cache(maxsize=None)
+def get_xdg_dir(env_var: str, default: str) -> Optional[Path]:
+    """Return an XDG base directory, resolved once per process, or None if the home directory is unknown."""
+    try:
+        return Path(os.environ.get(env_var) or default).expanduser()
+    except RuntimeError:
+        return None
+
+
+def get_config_cache_path(config_path: Path) -> Optional[Path]:
+    """Return the cache file path for a config file, keyed by its resolved path."""
+    xdg_cache_home = get_xdg_dir("XDG_CACHE_HOME", "~/.cache")
+    if xdg_cache_home is None:
+        return None
+    digest = hashlib.sha1(str(config_path.resolve()).encode("utf-8")).hexdigest()
+    return xdg_cache_home / PROJECT_NAME / f"config-{digest}.pkl"
+
+
+def load_cached_config(
+    cache_path: Path, stamp: Tuple[int, int]
+) -> Optional[Config]:
+    """Load a previously parsed config from the cache, or return None if it is missing or stale."""
+    try:
+        with open(cache_path, "rb") as f:
+            cached_stamp, config = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        return None
+    return config if cached_stamp == stamp else None
+
+
+def save_cached_config(
+    cache_path: Path, stamp: Tuple[int, int], config: Config
+) -> None:
+    """Store a parsed config in the cache, readable only by the current user, ignoring write failures."""
+    try:
+        cache_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # mkstemp creates the file with mode 0600; renaming it into place
+        # means concurrent readers never see a partial pickle
+        fd, tmp_path = tempfile.mkstemp(
+            dir=cache_path.parent, prefix=f".{cache_path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((stamp, config), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except OSError:
+        pass
+
+
 def load_config(config_filename: str = "config.yaml") -> Config:
     """Load configuration from environment variables and YAML file. Search in current directory and XDG config directory."""
+    env_get = os.environ.get
+    env_values = tuple(env_get(env_var) for _, env_var in ENV_VAR_MAPPING)
+
+    # Hand out a copy so callers can override values without touching the cache
+    return _load_config(config_filename, env_values).copy()
+
+
+@functools.lru_cache(maxsize=4)
+def _load_config(
+    config_filename: str, env_values: Tuple[Optional[str], ...]
+) -> Config:
+    """Load configuration for a given config file name and snapshot of environment values."""
 
     # Search for config file in current directory and XDG config directory
     config_path = Path(config_filename)
     if not config_path.exists():
-        xdg_config_home = Path(os.getenv("XDG_CONFIG_HOME", "~/.config")).expanduser()
-        config_path = xdg_config_home / PROJECT_NAME / config_filename
+        xdg_config_home = get_xdg_dir("XDG_CONFIG_HOME", "~/.config")
+        if xdg_config_home is not None:
+            config_path = xdg_config_home / PROJECT_NAME / config_filename
 
     # Load config from file if it exists
     config: Config = {}
-    if config_path.exists():
-        with open(config_path, "r") as f:
-            config = yaml.safe_load(f)
-
-    # Define a mapping of config keys to environment variable names
-    env_var_mapping = {
-        "api_key": "API_KEY",
-        "model": "MODEL",
-        "api_base_url": "API_BASE_URL",
-        "action": "ACTION",
-        "in_place": "IN_PLACE",
-    }
-
-    # Loop through the mapping and set values from environment variables, with precedence over config file
-    for config_key, env_var in env_var_mapping.items():
-        env_value = os.getenv(env_var)
-
-        # Special handling for boolean conversion
-        if config_key in ("in_place", "is_verbose"):
-            env_value = (
-                (str(env_value).lower() in ("yes", "true", "1", "on"))
-                if env_value is not None
-                else None
-            )
-        config[config_key] = env_value or config.get(config_key)
+    config_exists = config_path.exists()
+    if config_exists:
+        # Reuse the parsed config from the cache if the file has not changed
+        stat = config_path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cache_path = get_config_cache_path(config_path)
+        cached_config = load_cached_config(cache_path, stamp) if cache_path else None
+        if cached_config is not None:
+            config = cached_config
+        else:
+            import yaml
+
+            try:
+                from yaml import CSafeLoader as YamlLoader
+            except ImportError:
+                from yaml import SafeLoader as YamlLoader
+
+            with open(config_path, "rb") as f:
+                config = yaml.load(f, Loader=YamlLoader)
+            if cache_path:
+                save_cached_config(cache_path, stamp, config)
+
+    # Loop through the mapping and set values from environment variables, with precedence over config file.
+    # When neither a config file nor any of the variables is set, only the defaults below apply.
+    if config_exists or any(env_value is not None for env_value in env_values):
+        for (config_key, _), env_value in zip(ENV_VAR_MAPPING, env_values):
+            # Special handling for boolean conversion
+            if config_key in ("in_place", "is_verbose"):
+                env_value = (
+                    (env_value.lower() in TRUTHY_VALUES)
+                    if env_value is not None
+                    else None
+                )
+            config[config_key] = env_value or config.get(config_key)
 
     # Set default values if not provided in config or environment
     config.setdefault("model", "gpt-4-turbo")
@@ -62,52 +172,110 @@ def load_config(config_filename: str = "config.yaml") -> Config:
     return config
 
 
-def process_file(file_path: str, config: Config) -> None:
+def replace_file_contents(file_path: str, data: bytes) -> None:
+    """Atomically replace a file's contents, writing through symlinks and keeping its mode."""
+    real_path = os.path.realpath(file_path)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(real_path),
+        prefix=f".{os.path.basename(real_path)}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(real_path, tmp_path)
+        os.replace(tmp_path, real_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+async def process_file(
+    file_path: str,
+    client: "AsyncOpenAI",
+    model: str,
+    system_message: Dict[str, str],
+    in_place: bool,
+) -> None:
     """Perform a requested action using OpenAI's API on a single file."""
 
-    # Extract values from the config dictionary
-    model = config.get("model") or ""
-    action = config.get("action") or ""
-    api_key = config.get("api_key") or os.environ.get("API_KEY")
-    api_base_url = config.get("api_base_url")
-    in_place = config.get("in_place")
-
-    # Initialize the OpenAI client with the base URL
-    client = OpenAI(api_key=api_key, base_url=api_base_url)
-
-    with open(file_path, "r") as file:
-        file_content = file.read()
+    # Undecodable bytes are replaced when only printing, but in-place edits must
+    # not write replacement characters back over the original file
+    try:
+        errors = "strict" if in_place else "replace"
+        file_content = Path(file_path).read_bytes().decode("utf-8", errors)
+    except UnicodeDecodeError:
+        print(f"Skipping file that is not valid UTF-8: {file_path}")
+        return
 
     ai_args = {
         "messages": [
-            {"role": "system", "content": action},
-            {
-                "role": "user",
-                "content": f"{file_content}\n\n# Please only return the modified file content, and nothing else.",
-            },
+            system_message,
+            {"role": "user", "content": file_content + USER_PROMPT_SUFFIX},
         ],
         "model": model,
         "stream": not in_place,
     }
 
-    chat_completion = client.chat.completions.create(**ai_args)
+    chat_completion = await client.chat.completions.create(**ai_args)
 
     if in_place:
         # If editing in-place, just get the result without streaming
         output = (chat_completion.choices[0].message.content or "").strip()
 
         # Write the output back to the file (in-place modification)
-        with open(file_path, "w") as file:
-            file.write(output)
+        # fsync blocks, so keep it off the event loop
+        await asyncio.to_thread(
+            replace_file_contents, file_path, output.encode("utf-8")
+        )
         print(f"Updated file: {file_path}")
     else:
         # Stream output to stdout
-        response = client.chat.completions.create(**ai_args)
         print(f"Output for {file_path}:")
-        for chunk in response:
-            chunk_content = chunk.choices[0].delta.content or ""
+        write = sys.stdout.write
+        async for chunk in chat_completion:
+            chunk_content = chunk.choices[0].delta.content
             if chunk_content:
-                print(chunk_content, end="")
+                write(chunk_content)
+        write("\n")
+        sys.stdout.flush()
+
+
+async def process_files(
+    file_paths: List[str],
+    client: "AsyncOpenAI",
+    model: str,
+    action: str,
+    in_place: bool,
+    max_workers: int,
+) -> None:
+    """Process all files, running in-place edits concurrently up to `max_workers` at a time."""
+    # The system message is identical for every file, so build it once
+    system_message = {"role": "system", "content": action}
+
+    async with client:
+        if not in_place:
+            # Streamed output must stay in order, so process sequentially
+            for file_path in file_paths:
+                await process_file(file_path, client, model, system_message, in_place)
+            return
+
+        # In-place edits are independent, so overlap the API round-trips
+        semaphore = asyncio.Semaphore(max_workers)
+
+        async def process_file_limited(file_path: str) -> None:
+            async with semaphore:
+                # Report failures per file so one error doesn't cancel the other edits
+                try:
+                    await process_file(
+                        file_path, client, model, system_message, in_place
+                    )
+                except Exception as exc:
+                    print(f"Failed to update file: {file_path}: {exc}")
+
+        await asyncio.gather(*(process_file_limited(p) for p in file_paths))
 
 
 def parse_cli_args():
@@ -155,14 +323,120 @@ def parse_cli_args():
     return parser.parse_args()
 
 
+@functools.lru_cache(maxsize=None)
 def get_gitignore_spec():
     """Load gitignore rules and return a pathspec for filtering."""
     if os.path.exists(".gitignore"):
+        import pathspec
+
         with open(".gitignore", "r") as gitignore:
             return pathspec.PathSpec.from_lines("gitwildmatch", gitignore)
     return None
 
 
+def _has_magic(segment: str) -> bool:
+    """Return True if a path segment contains glob wildcards."""
+    return any(c in segment for c in "*?[")
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    """Return True if a directory entry is a directory, treating errors (e.g. ELOOP) as False."""
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _is_file(entry: os.DirEntry) -> bool:
+    """Return True if a directory entry is a regular file, treating errors as False."""
+    try:
+        return entry.is_file()
+    except OSError:
+        return False
+
+
+def _iter_files(
+    base: str, parts: List[str], ancestors: FrozenSet[Tuple[int, int]] = frozenset()
+) -> Iterator[str]:
+    """Yield files under `base` matching the remaining pattern segments.
+
+    `ancestors` holds the (st_dev, st_ino) of directories already entered through
+    `**`, so symlinks pointing back up the tree are not followed forever.
+    """
+    segment, rest = parts[0], parts[1:]
+
+    if segment == "**":
+        # Stop at a directory already being walked (a symlink loop)
+        try:
+            stat = os.stat(base or ".")
+        except OSError:
+            return
+        key = (stat.st_dev, stat.st_ino)
+        if key in ancestors:
+            return
+        ancestors = ancestors | {key}
+
+        # "**" matches zero or more directories, skipping hidden entries like glob
+        if rest:
+            yield from _iter_files(base, rest)
+        try:
+            entries = list(os.scandir(base or "."))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            path = os.path.join(base, entry.name)
+            if _is_dir(entry):
+                yield from _iter_files(path, parts, ancestors)
+            elif not rest and _is_file(entry):
+                yield path
+    elif not _has_magic(segment):
+        path = os.path.join(base, segment)
+        if rest:
+            if os.path.isdir(path):
+                yield from _iter_files(path, rest, ancestors)
+        elif os.path.isfile(path):
+            yield path
+    else:
+        try:
+            entries = list(os.scandir(base or "."))
+        except OSError:
+            return
+        include_hidden = segment.startswith(".")
+        for entry in entries:
+            if entry.name.startswith(".") and not include_hidden:
+                continue
+            if not fnmatch.fnmatchcase(entry.name, segment):
+                continue
+            path = os.path.join(base, entry.name)
+            if rest:
+                if _is_dir(entry):
+                    yield from _iter_files(path, rest, ancestors)
+            elif _is_file(entry):
+                yield path
+
+
+def iwalk(pattern: str) -> Iterator[str]:
+    """Yield files matching a glob pattern (supporting `**`) using os.scandir.
+
+    Directory entries carry their file type, so matching does not need a
+    separate stat call per entry the way glob.glob does.
+    """
+    # Keep the drive or UNC share (e.g. "C:" or "\\\\server\\share") as the base
+    base, path = os.path.splitdrive(pattern)
+    path = path.replace(os.sep, "/")
+    if path.endswith("/") and path.strip("/"):
+        # A trailing separator only matches directories, and only files are yielded
+        return
+    if path.startswith("/"):
+        # Rooted path
+        base += os.sep
+    parts = [part for part in path.split("/") if part]
+    if parts:
+        yield from _iter_files(base, parts)
+
+
 def main():
     args = parse_cli_args()
 
@@ -193,27 +467,49 @@ def main():
     file_paths = []
     print(f"Scanning files: {args.file_paths}")
     for file_pattern in args.file_paths:
-        matched_files = glob.glob(file_pattern, recursive=True)
+        file_paths.extend(iwalk(file_pattern))
 
-        # If gitignore rules exist, filter out ignored files
-        if gitignore_spec:
-            matched_files = [
-                f for f in matched_files if not gitignore_spec.match_file(f)
-            ]
+    # Drop files matched by more than one pattern, keeping the first occurrence
+    file_paths = list(dict.fromkeys(file_paths))
 
-        file_paths.extend(matched_files)
+    # If gitignore rules exist, filter out ignored files in a single pass
+    if gitignore_spec:
+        ignored = set(gitignore_spec.match_files(file_paths))
+        file_paths = [f for f in file_paths if f not in ignored]
     print(f"Found {len(file_paths)} files to process: {file_paths}")
     args.file_paths = file_paths
 
-    # Process each file
+    # Process each file (iwalk only yields regular files)
+    valid_paths = []
     for file_path in args.file_paths:
-        if os.path.isfile(file_path):
-            if args.dry:
-                print(f"Would modify: {file_path}")
-            else:
-                process_file(file_path, config)
+        if args.dry:
+            print(f"Would modify: {file_path}")
         else:
-            print(f"File not found: {file_path}")
+            valid_paths.append(file_path)
+
+    if not valid_paths:
+        return
+
+    # Limit on concurrent API requests
+    try:
+        max_workers = max(1, int(os.environ.get("AI_FW_WORKERS", DEFAULT_WORKERS)))
+    except ValueError:
+        print("Error: AI_FW_WORKERS must be an integer.")
+        return
+
+    # Extract values from the config dictionary
+    get = config.get
+    action = get("action") or ""
+    in_place = bool(get("in_place"))
+
+    # Initialize the OpenAI client once so connections are reused across files
+    from openai import AsyncOpenAI
+
+    client = AsyncOpenAI(api_key=api_key, base_url=get("api_base_url"))
+
+    asyncio.run(
+        process_files(valid_paths, client, model, action, in_place, max_workers)
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from main import iwalk
+
+
+class IwalkTest(unittest.TestCase):
+    def setUp(self):
+        self._cwd = os.getcwd()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self._tmp.name)
+        names = ("a.py", "b.txt", "src/c.py", "src/deep/d.py", ".hidden/e.py", "src/.f.py")
+        for name in names:
+            path = self.root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.touch()
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp.cleanup()
+
+    def walk(self, pattern):
+        return sorted(iwalk(pattern))
+
+    def test_literal_path(self):
+        self.assertEqual(self.walk("src/c.py"), [os.path.join("src", "c.py")])
+        self.assertEqual(self.walk("missing.py"), [])
+
+    def test_wildcard_segment(self):
+        self.assertEqual(self.walk("*.py"), ["a.py"])
+        self.assertEqual(self.walk("src/*"), [os.path.join("src", "c.py")])
+
+    def test_double_star_matches_zero_or_more_directories(self):
+        self.assertEqual(
+            self.walk("**/*.py"),
+            ["a.py", os.path.join("src", "c.py"), os.path.join("src", "deep", "d.py")],
+        )
+        self.assertEqual(
+            self.walk("src/**"),
+            [os.path.join("src", "c.py"), os.path.join("src", "deep", "d.py")],
+        )
+
+    def test_hidden_entries_need_an_explicit_dot(self):
+        self.assertNotIn(os.path.join(".hidden", "e.py"), self.walk("**/*.py"))
+        self.assertEqual(self.walk("src/.*"), [os.path.join("src", ".f.py")])
+        self.assertEqual(self.walk(".hidden/*.py"), [os.path.join(".hidden", "e.py")])
+
+    def test_trailing_separator_matches_nothing(self):
+        self.assertEqual(self.walk("a.py/"), [])
+        self.assertEqual(self.walk("src/"), [])
+
+    def test_absolute_pattern(self):
+        root = os.path.realpath(self.root)
+        self.assertEqual(
+            self.walk(os.path.join(root, "src", "*.py")),
+            [os.path.join(root, "src", "c.py")],
+        )
+
+    def test_symlink_loop_is_walked_once(self):
+        try:
+            os.symlink("..", self.root / "src" / "loop")
+            os.symlink("self", self.root / "self")
+        except (OSError, NotImplementedError):
+            self.skipTest("symlinks are not supported")
+        self.assertEqual(
+            self.walk("**/*.py"),
+            ["a.py", os.path.join("src", "c.py"), os.path.join("src", "deep", "d.py")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()